@@ -0,0 +1,450 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import orjson
+import pydantic_core
+from langgraph.graph import END
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from mcp.types import CallToolResult, TextContent
+
+from src.state.simple_mcp_state import SimpleMCPState
+from src.proxy.mcp_proxy import apply, GetLangChainTools, RunTool
+from src.utils import configure_llm_cache, load_chat_model, extract_error_details, log_tool_execution
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# orjson fallback for pydantic models and other non-JSON types in tool output
+_to_jsonable = functools.partial(pydantic_core.to_jsonable_python, fallback=str)
+
+# MCP server configuration at the project root
+CONFIG_PATH = Path(__file__).parent.parent.parent / "mcp-servers-config.json"
+
+# Parsed MCP config and the tools discovered per server, keyed by (config path, mtime)
+# so repeat graph runs skip the JSON parse and only query servers that have not
+# answered yet (e.g. ones that were down on the previous run).
+_CONFIG_CACHE: dict[tuple[str, int], tuple[dict, dict[str, list]]] = {}
+
+# Answer repeated prompts from the local LLM cache when enabled
+configure_llm_cache()
+
+# Maximum number of MCP servers started at the same time during discovery
+MAX_CONCURRENT_SERVER_STARTS = 8
+
+# Maximum number of tool calls executed at the same time
+MAX_CONCURRENT_TOOL_CALLS = 8
+
+# Simple system prompt for our example, built once and reused on every LLM step
+SYSTEM_PROMPT = "You are a helpful assistant with access to various tools. Use them when needed to help the user."
+_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("placeholder", "{messages}")
+])
+
+# Same prompt with a prompt-caching breakpoint after the system message. Anthropic only
+# caches up to an explicit breakpoint, and its cached prefix covers the bound tool schemas
+# and the system text. OpenAI/Azure cache stable prompt prefixes automatically.
+_CACHED_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=[{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]),
+    ("placeholder", "{messages}")
+])
+
+
+def _prompt_for(model) -> ChatPromptTemplate:
+    """Pick the prompt variant that lets the model's provider cache the static prefix"""
+    return _CACHED_PROMPT if model._llm_type == "anthropic-chat" else _PROMPT
+
+
+# Tool-bound models keyed by (model, tool signature), so each tool's JSON schema is
+# converted once rather than on every LLM step. The signature covers tool names,
+# descriptions and argument schemas, so a server that changes a schema gets a fresh
+# binding. Least recently used entries are evicted past MAX_BOUND_MODELS.
+MAX_BOUND_MODELS = 128
+_BOUND_MODELS: OrderedDict[tuple[int, str], Any] = OrderedDict()
+
+
+def _tool_schema(tool) -> dict:
+    """Full argument schema sent to the model (including required and other top-level keys)"""
+    schema = tool.tool_call_schema
+    # MCP tools carry a JSON schema dict; tools defined in Python have a pydantic model
+    return schema if isinstance(schema, dict) else schema.model_json_schema()
+
+
+def _tool_signature(tools: list) -> str:
+    """Order-independent hash of the tools' names, descriptions and argument schemas"""
+    digest = hashlib.sha256()
+    for tool in sorted(tools, key=lambda tool: tool.name):
+        digest.update(orjson.dumps(
+            [tool.name, tool.description, _tool_schema(tool)],
+            default=_to_jsonable,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ))
+    return digest.hexdigest()
+
+
+def _bind_tools(model, tools: list):
+    """Return the model bound to tools, reusing an earlier binding of the same tool set"""
+    key = (id(model), _tool_signature(tools))
+    bound = _BOUND_MODELS.get(key)
+    if bound is not None:
+        _BOUND_MODELS.move_to_end(key)
+        return bound
+    
+    bound = _BOUND_MODELS[key] = model.bind_tools(tools)
+    if len(_BOUND_MODELS) > MAX_BOUND_MODELS:
+        _BOUND_MODELS.popitem(last=False)
+    return bound
+
+
+# Results of read-only tool calls, keyed by (tool name, canonical JSON args) and kept for
+# TOOL_CACHE_TTL seconds so repeated identical calls skip the MCP round-trip. Opt-in per
+# tool: only tools whose name matches the TOOL_CACHE_PATTERN regex are cached, since
+# caching a tool that changes state would silently drop the repeated call.
+_TOOL_CACHE_PATTERN = re.compile(os.getenv("TOOL_CACHE_PATTERN")) if os.getenv("TOOL_CACHE_PATTERN") else None
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+MAX_CACHED_TOOL_RESULTS = 2048
+_TOOL_RESULTS: OrderedDict[tuple[str, bytes], tuple[float, str]] = OrderedDict()
+
+
+def _tool_cache_key(tool_name: str, tool_args: dict) -> tuple[str, bytes] | None:
+    """Cache key for a tool call, or None when the tool's results aren't cacheable"""
+    if _TOOL_CACHE_PATTERN is None or not _TOOL_CACHE_PATTERN.fullmatch(tool_name):
+        return None
+    return tool_name, orjson.dumps(tool_args, default=_to_jsonable, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+def _get_cached_result(key: tuple[str, bytes]) -> str | None:
+    """Return a cached tool result that hasn't expired yet"""
+    entry = _TOOL_RESULTS.get(key)
+    if entry is None:
+        return None
+    expires_at, content = entry
+    if expires_at <= time.monotonic():
+        del _TOOL_RESULTS[key]
+        return None
+    _TOOL_RESULTS.move_to_end(key)
+    return content
+
+
+def _cache_result(key: tuple[str, bytes], content: str) -> None:
+    """Store a tool result, evicting the least recently used entry when full"""
+    _TOOL_RESULTS[key] = (time.monotonic() + TOOL_CACHE_TTL, content)
+    _TOOL_RESULTS.move_to_end(key)
+    if len(_TOOL_RESULTS) > MAX_CACHED_TOOL_RESULTS:
+        _TOOL_RESULTS.popitem(last=False)
+
+
+@functools.cache
+def _get_model():
+    """Load the chat model on first use and reuse it (and its HTTP client) afterwards"""
+    logger.debug("Loading chat model...")
+    return load_chat_model("azure_openai")
+
+
+async def discover_mcp_servers(state: SimpleMCPState) -> SimpleMCPState:
+    """
+    Discover and load all available MCP servers from mcp-servers-config.json
+    """
+    logger.info("🔍 Starting MCP server discovery...")
+    
+    try:
+        config_path = CONFIG_PATH
+        cache_key = (str(config_path), config_path.stat().st_mtime_ns)
+        
+        cached = _CONFIG_CACHE.get(cache_key)
+        if cached is not None:
+            mcp_servers, server_tools = cached
+        else:
+            logger.debug("Loading MCP config from: %s", config_path)
+            
+            # Read off the event loop so other graph work isn't blocked on disk I/O
+            raw_config = await asyncio.to_thread(config_path.read_bytes)
+            config_data = orjson.loads(raw_config)
+            mcp_servers = config_data.get("mcpServers", {})
+            
+            if not mcp_servers:
+                logger.warning("⚠️ No MCP servers found in configuration")
+                return {"status": "error"}
+            
+            logger.info("📋 Found %s MCP server(s): %s", len(mcp_servers), list(mcp_servers.keys()))
+            server_tools = {}
+            _CONFIG_CACHE.clear()
+            _CONFIG_CACHE[cache_key] = (mcp_servers, server_tools)
+        
+        # Only query servers without cached tools, so a server that failed last time is retried
+        server_names = [name for name in mcp_servers if name not in server_tools]
+        if not server_names:
+            logger.info("♻️ Using cached MCP discovery for %s server(s)", len(mcp_servers))
+        
+        # Each server spawns its own process, so query them concurrently (bounded so a
+        # large config doesn't start every server at once). This also opens the pooled
+        # sessions reused by tool execution.
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SERVER_STARTS)
+        
+        async def get_tools(server_name: str) -> list:
+            async with semaphore:
+                logger.info("📝 Getting LangChain tools from server: %s", server_name)
+                logger.debug("Server config: %s", mcp_servers[server_name])
+                return await apply(server_name, mcp_servers[server_name], GetLangChainTools())
+        
+        results = await asyncio.gather(
+            *(get_tools(name) for name in server_names),
+            return_exceptions=True
+        )
+        
+        for server_name, result in zip(server_names, results):
+            if isinstance(result, Exception):
+                logger.error("❌ Failed to get tools from server %s: %s", server_name, result)
+                # Continue with other servers
+                continue
+            
+            server_tools[server_name] = result
+            logger.info("✅ Got %s LangChain tools from %s", len(result), server_name)
+            if result and logger.isEnabledFor(logging.DEBUG):
+                tool_names = [tool.name for tool in result if hasattr(tool, 'name')]
+                logger.debug("Tools from %s: %s", server_name, tool_names)
+        
+        all_langchain_tools = []
+        tool_to_server = {}
+        for server_name in mcp_servers:
+            langchain_tools = server_tools.get(server_name, [])
+            all_langchain_tools.extend(langchain_tools)
+            for tool in langchain_tools:
+                tool_to_server.setdefault(tool.name, server_name)
+        
+        # Send tools in a stable order so config edits or server start order don't change
+        # the prompt prefix and bust provider-side prompt caching
+        all_langchain_tools.sort(key=lambda tool: tool.name)
+        
+        logger.info("✅ Successfully collected %s LangChain tools from MCP servers", len(all_langchain_tools))
+        
+        return {
+            "available_tools": all_langchain_tools,  # Store LangChain tools for binding
+            "mcp_servers": mcp_servers,  # Store configs for on-demand execution  
+            "tool_to_server": tool_to_server,  # Route tool calls straight to their server
+            "status": "loading_tools"
+        }
+        
+    except FileNotFoundError:
+        logger.error("❌ mcp-servers-config.json not found")
+        return {"status": "error"}
+    except orjson.JSONDecodeError as e:
+        logger.error("❌ Failed to parse mcp-servers-config.json: %s", e)
+        return {"status": "error"}
+    except Exception as e:
+        logger.error("❌ Error discovering MCP servers: %s", e)
+        return {"status": "error"}
+
+async def llm_with_mcp_tools(state: SimpleMCPState) -> SimpleMCPState:
+    """
+    LLM node that can call MCP tools
+    Binds available tools to LLM and processes user messages
+    """
+    logger.info("🤖 Starting LLM processing...")
+    
+    try:
+        messages = state.get("messages", [])
+        available_tools = state.get("available_tools", [])
+        
+        if not messages:
+            logger.warning("⚠️ No messages to process")
+            return {"status": "error", "last_message_kind": "error"}
+        
+        logger.info("📝 Processing %s message(s)", len(messages))
+        logger.debug("Last message type: %s", type(messages[-1]).__name__)
+        
+        model = _get_model()
+        
+        if available_tools:
+            logger.info("🔗 Binding %s LangChain tools to LLM", len(available_tools))
+            if logger.isEnabledFor(logging.DEBUG):
+                tool_names = [tool.name for tool in available_tools if hasattr(tool, 'name')]
+                logger.debug("Available tools: %s", tool_names)
+            llm_with_tools = _bind_tools(model, available_tools)
+        else:
+            logger.warning("⚠️ No tools available for binding")
+            llm_with_tools = model
+        
+        # Create prompt with messages
+        logger.debug("Creating prompt and invoking LLM...")
+        formatted_prompt = await _prompt_for(model).ainvoke({"messages": messages})
+        
+        response = await llm_with_tools.ainvoke(formatted_prompt)
+
+        # Check if response has tool calls
+        if isinstance(response, AIMessage) and response.tool_calls:
+            logger.info("🔧 LLM generated %s tool call(s)", len(response.tool_calls))
+            if logger.isEnabledFor(logging.DEBUG):
+                tool_names = [call.get('name', 'unknown') for call in response.tool_calls]
+                logger.debug("Tool calls requested: %s", tool_names)
+            status = "calling_tool"
+            last_message_kind = "tool_call"
+        else:
+            logger.info("💬 LLM generated text response")
+            logger.info("🆕 Response preview: %s...", response.content)
+            status = "ready"
+            last_message_kind = "text"
+        
+        # The add_messages reducer appends the response to the conversation
+        return {
+            "messages": [response],
+            "status": status,
+            "last_message_kind": last_message_kind
+        }
+        
+    except Exception as e:
+        logger.error("❌ Error in LLM processing: %s", e)
+        return {"status": "error", "last_message_kind": "error"}
+
+
+def _as_content(tool_output: Any) -> str:
+    """Turn tool output into ToolMessage content without going through repr()
+
+    Strings are used as-is, raw MCP results keep only their text blocks (binary
+    blobs aren't useful in the prompt) and anything else is serialized to JSON.
+    """
+    if isinstance(tool_output, str):
+        return tool_output
+    if isinstance(tool_output, CallToolResult):
+        return "\n".join(block.text for block in tool_output.content if isinstance(block, TextContent))
+    return orjson.dumps(tool_output, default=_to_jsonable, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+async def execute_single_tool(tool_call: dict, mcp_servers: dict, tool_to_server: dict | None = None) -> ToolMessage:
+    """Execute a single tool call on the server that provides it, falling back to trying all servers"""
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    tool_call_id = tool_call["id"]
+    
+    # logger.debug(f"Executing tool: {tool_name} with args: {tool_args}")
+    logger.debug("Executing tool: %s.", tool_name)
+    
+    cache_key = _tool_cache_key(tool_name, tool_args)
+    if cache_key is not None:
+        cached = _get_cached_result(cache_key)
+        if cached is not None:
+            logger.info("♻️ Using cached result for tool %s", tool_name)
+            return ToolMessage(content=cached, tool_call_id=tool_call_id)
+    
+    server_name = (tool_to_server or {}).get(tool_name)
+    if server_name in mcp_servers:
+        candidate_servers = [server_name]
+    else:
+        logger.debug("No indexed server for tool %s, trying all servers", tool_name)
+        candidate_servers = list(mcp_servers)
+    
+    last_error = None
+    for server_name in candidate_servers:
+        server_config = mcp_servers[server_name]
+        try:
+            log_tool_execution(tool_name, server_name, tool_args, "started")
+            
+            tool_output = await apply(server_name, server_config, RunTool(tool_name, **tool_args))
+            
+            content = _as_content(tool_output)
+            if cache_key is not None:
+                _cache_result(cache_key, content)
+            log_tool_execution(tool_name, server_name, tool_args, "success", content)
+            return ToolMessage(content=content, tool_call_id=tool_call_id)
+            
+        except Exception as e:
+            last_error = e
+            error_details = extract_error_details(e)
+            log_tool_execution(tool_name, server_name, tool_args, "failed", error_details)
+            
+            # Stop trying other servers for validation errors
+            if "validation_error" in str(e).lower() or "400" in str(e):
+                logger.info("🛑 Validation error for %s, stopping server attempts", tool_name)
+                return ToolMessage(content=error_details, tool_call_id=tool_call_id)
+    
+    # No server could execute the tool
+    final_error = extract_error_details(last_error) if last_error else f"Tool {tool_name} not found on any server"
+    logger.error("❌ Tool %s failed on all servers", tool_name)
+    return ToolMessage(content=f"Error: {final_error}", tool_call_id=tool_call_id)
+
+
+async def process_tool_calls(tool_calls: list, mcp_servers: dict, tool_to_server: dict | None = None) -> list[ToolMessage]:
+    """Process all tool calls concurrently and return tool messages in call order"""
+    total_tools = len(tool_calls)
+    logger.info("🔧 Processing %s tool call(s)", total_tools)
+    
+    # Bound fan-out so a large batch of tool calls doesn't spawn too many MCP processes at once
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+    
+    async def run_one(i: int, tool_call: dict) -> ToolMessage:
+        async with semaphore:
+            logger.debug("🔧 [%s/%s] Executing tool: %s", i, total_tools, tool_call['name'])
+            return await execute_single_tool(tool_call, mcp_servers, tool_to_server)
+    
+    results = await asyncio.gather(
+        *(run_one(i, tool_call) for i, tool_call in enumerate(tool_calls, 1)),
+        return_exceptions=True
+    )
+    
+    # An unexpected failure in one call becomes an error message for that call only,
+    # so the LLM still gets a response for every tool_call_id
+    tool_messages = []
+    for tool_call, result in zip(tool_calls, results):
+        if isinstance(result, Exception):
+            logger.error("❌ Unexpected error executing tool %s: %s", tool_call.get('name'), result)
+            result = ToolMessage(content=f"Error: {extract_error_details(result)}", tool_call_id=tool_call["id"])
+        tool_messages.append(result)
+    
+    return tool_messages
+
+
+async def execute_mcp_tool(state: SimpleMCPState) -> SimpleMCPState:
+    """Execute MCP tool calls from the LLM response"""
+    logger.info("⚡ Starting MCP tool execution phase...")
+    
+    try:
+        messages = state.get("messages", [])
+        if not messages:
+            logger.warning("⚠️ No messages to process")
+            return {"status": "error", "last_message_kind": "error"}
+        
+        last_message = messages[-1]
+        if not (isinstance(last_message, AIMessage) and last_message.tool_calls):
+            logger.warning("⚠️ No tool calls found")
+            return {"status": "error", "last_message_kind": "error"}
+        
+        mcp_servers = state.get("mcp_servers", {})
+        logger.info("📋 Found %s MCP servers: %s", len(mcp_servers), list(mcp_servers.keys()))
+        
+        # Process all tool calls
+        tool_to_server = state.get("tool_to_server", {})
+        tool_messages = await process_tool_calls(last_message.tool_calls, mcp_servers, tool_to_server)
+        logger.info("🔧 Tool execution completed: %s tool calls processed", len(tool_messages))
+
+        return {
+            "messages": tool_messages,
+            "status": "ready",
+            "last_message_kind": "tool_result"
+        }
+        
+    except Exception as e:
+        logger.error("❌ Critical error in tool execution phase: %s", e)
+        return {"status": "error", "last_message_kind": "error"}
+
+
+# Next node for each kind of last message; anything else (text, error) ends the run
+_NEXT_NODE = {
+    "tool_call": "execute_tools",
+    "tool_result": "llm_with_tools",
+}
+
+
+def should_continue(state: SimpleMCPState) -> str:
+    """
+    Determine if we should continue to tool execution or end
+    """
+    return _NEXT_NODE.get(state.get("last_message_kind"), END)
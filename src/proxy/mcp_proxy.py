@@ -1,28 +1,48 @@
 from abc import ABC, abstractmethod
 import asyncio
+import functools
+import hashlib
 import os
 import logging
-from datetime import datetime
-from typing import Any
+import re
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import anyio
 from mcp import (
     ClientSession,
     StdioServerParameters,
     stdio_client,
 )
+from mcp.types import TextContent
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
 # Add SSE client support for URL-based servers
 try:
     from mcp.client.sse import sse_client
     SSE_AVAILABLE = True
 except ImportError:
     SSE_AVAILABLE = False
-    print("⚠️ SSE client not available, URL-based servers will not work")
+    logger.warning("⚠️ SSE client not available, URL-based servers will not work")
 
+import orjson
 import pydantic_core
 from langchain_core.tools import ToolException
-from langchain_mcp_adapters.tools import load_mcp_tools
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
 
-# Configure logging
-logger = logging.getLogger(__name__)
+# ${VAR_NAME} references in server env values
+_ENV_VAR_RE = re.compile(r'\$\{([^}]+)\}')
+
+# Errors meaning the underlying MCP connection is unusable
+_CONNECTION_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    BrokenPipeError,
+    ConnectionError,
+)
 
 
 class MCPSessionFunction(ABC):
@@ -31,13 +51,36 @@ class MCPSessionFunction(ABC):
         pass
 
 
+# Converted LangChain tools per server, with the session they were built for and a
+# hash of the server's tool list. The tools call back into that session, so they are
+# only reused while the pooled session and the advertised schemas stay the same.
+_tools_cache: dict[str, tuple[ClientSession, str, list[Any]]] = {}
+
+
 class GetLangChainTools(MCPSessionFunction):
     """Get tools using the LangChain MCP adapter for proper format conversion"""
     async def __call__(
         self, server_name: str, session: ClientSession
     ) -> list[Any]:
+        mcp_tools = []
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            mcp_tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                break
+        
+        digest = hashlib.sha256(pydantic_core.to_json(mcp_tools)).hexdigest()
+        cached = _tools_cache.get(server_name)
+        if cached is not None and cached[0] is session and cached[1] == digest:
+            logger.debug("Reusing converted tools for server '%s'", server_name)
+            return list(cached[2])
+        
         # Use the adapter to get properly formatted LangChain tools
-        return await load_mcp_tools(session)
+        tools = [convert_mcp_tool_to_langchain_tool(session, tool) for tool in mcp_tools]
+        _tools_cache[server_name] = (session, digest, tools)
+        return list(tools)
 
 
 class RunTool(MCPSessionFunction):
@@ -50,43 +93,82 @@ class RunTool(MCPSessionFunction):
         server_name: str,
         session: ClientSession,
     ) -> Any:
-        logger.info(f"🔧 Executing tool '{self.tool_name}' on server '{server_name}' with args: {self.kwargs}")
+        logger.debug("🔧 Executing tool '%s' on server '%s' with args: %s", self.tool_name, server_name, self.kwargs)
         
         try:
             result = await session.call_tool(self.tool_name, arguments=self.kwargs)
-            content = pydantic_core.to_json(result.content).decode()
+            # Most tools answer with a single text block: pass its text through as-is
+            # instead of wrapping it in JSON
+            if len(result.content) == 1 and isinstance(result.content[0], TextContent):
+                content = result.content[0].text
+            else:
+                content = pydantic_core.to_json(result.content).decode()
             
             if result.isError:
-                logger.error(f"❌ MCP tool '{self.tool_name}' returned error: {content}")
+                logger.error("❌ MCP tool '%s' returned error: %s", self.tool_name, content)
                 # Preserve full error context with structured information
                 raise ToolException(f"MCP Tool Error from {server_name}: {content}")
             
-            logger.info(f"✅ Tool '{self.tool_name}' executed successfully on '{server_name}'")
-            logger.debug(f"Tool result preview: {content[:100]}...")
+            logger.debug("✅ Tool '%s' executed successfully on '%s'", self.tool_name, server_name)
+            logger.debug("Tool result preview: %.100s...", content)
             return content
             
         except ToolException:
             # Re-raise ToolException with preserved context
             raise
         except Exception as e:
-            logger.error(f"❌ Unexpected error executing tool '{self.tool_name}' on '{server_name}': {e}")
+            logger.error("❌ Unexpected error executing tool '%s' on '%s': %s", self.tool_name, server_name, e)
             raise ToolException(f"Tool execution failed on {server_name}: {str(e)}")
 
 
+class _KeepUnknownVars:
+    """format_map mapping that leaves unknown ${VAR_NAME} references untouched"""
+    __slots__ = ("env_vars",)
+
+    def __init__(self, env_vars: dict):
+        self.env_vars = env_vars
+
+    def __getitem__(self, var_name: str) -> str:
+        return self.env_vars.get(var_name, "${" + var_name + "}")
+
+
+@functools.lru_cache(maxsize=256)
+def _format_template(value: str) -> str | None:
+    """Rewrite ${VAR_NAME} references into a str.format_map template, once per value
+
+    Returns None when a variable name can't be a format field (format_map would
+    treat it as an index or attribute lookup).
+    """
+    parts = []
+    end = 0
+    for match in _ENV_VAR_RE.finditer(value):
+        var_name = match.group(1)
+        if not var_name.isidentifier():
+            return None
+        parts.append(value[end:match.start()].replace("{", "{{").replace("}", "}}"))
+        parts.append("{" + var_name + "}")
+        end = match.end()
+    parts.append(value[end:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
 def interpolate_env_vars(value: str, env_vars: dict) -> str:
     """Interpolate environment variables in format ${VAR_NAME}"""
-    import re
+    template = _format_template(value)
+    if template is not None:
+        return template.format_map(_KeepUnknownVars(env_vars))
     
     def replace_var(match):
         var_name = match.group(1)
         return env_vars.get(var_name, match.group(0))  # Return original if not found
     
-    return re.sub(r'\$\{([^}]+)\}', replace_var, value)
+    return _ENV_VAR_RE.sub(replace_var, value)
 
 
-async def apply(server_name: str, server_config: dict, fn: MCPSessionFunction) -> Any:
-    # Non-blocking environment access
-    env_vars = await asyncio.to_thread(lambda: dict(os.environ))
+@asynccontextmanager
+async def open_session(server_name: str, server_config: dict) -> AsyncIterator[ClientSession]:
+    """Start an MCP server (or connect to a URL-based one) and yield an initialized session"""
+    env_vars = os.environ.copy()
     
     # Check if this is a URL-based server
     if "url" in server_config:
@@ -94,13 +176,13 @@ async def apply(server_name: str, server_config: dict, fn: MCPSessionFunction) -
             raise Exception(f"SSE client not available for URL-based server: {server_name}")
         
         url = server_config["url"]
-        print(f"📝 [{datetime.now().isoformat()}] Starting SSE session with URL-based server: {server_name} ({url})")
+        logger.debug("📝 Starting SSE session with URL-based server: %s (%s)", server_name, url)
         
         # For URL-based servers, use SSE client
         async with sse_client(url) as (read, write):
             async with ClientSession(read, write) as session:
                 await session.initialize()
-                return await fn(server_name, session)
+                yield session
     
     else:
         # Handle stdio-based servers (existing logic)
@@ -122,8 +204,121 @@ async def apply(server_name: str, server_config: dict, fn: MCPSessionFunction) -
             env={**env_vars, **interpolated_env},
         )
 
-        print(f"📝 [{datetime.now().isoformat()}] Starting stdio session with server: {server_name}")
+        logger.debug("📝 Starting stdio session with server: %s", server_name)
         async with stdio_client(server_params) as (read, write):
             async with ClientSession(read, write) as session:
                 await session.initialize()
-                return await fn(server_name, session)
+                yield session
+
+
+def _is_connection_error(exc: BaseException | None) -> bool:
+    """Check whether an exception (or anything it was raised from) means the session is gone"""
+    while exc is not None:
+        if isinstance(exc, _CONNECTION_ERRORS):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class MCPServerManager:
+    """Keeps one long-lived session per MCP server so repeated calls don't respawn the server.
+
+    Each session is owned by a background task that enters and exits the
+    stdio/SSE contexts, since anyio requires both to happen in the same task.
+    Sessions are tied to the event loop that opened them; when the loop
+    changes (e.g. a new ``asyncio.run``) they are reopened on first use.
+    A server whose configuration changes is restarted. Call ``aclose()``
+    before the event loop ends so the servers shut down cleanly.
+    """
+
+    def __init__(self):
+        self.sessions: dict[str, ClientSession] = {}
+        self._connections: dict[str, tuple[asyncio.Task, asyncio.Event, asyncio.Future, bytes]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def get(self, server_name: str, server_config: dict) -> ClientSession:
+        """Return the session for a server, connecting on first use"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions from a previous event loop can't be used (or closed) from this one
+            self.sessions.clear()
+            self._connections.clear()
+            self._loop = loop
+        
+        fingerprint = orjson.dumps(server_config, option=orjson.OPT_SORT_KEYS)
+        connection = self._connections.get(server_name)
+        if connection is not None and connection[3] != fingerprint:
+            logger.info("🔄 Configuration of MCP server %s changed, restarting it", server_name)
+            await self._close(server_name)
+            # Another caller may have reconnected while the old server was stopping
+            connection = self._connections.get(server_name)
+        
+        if connection is None:
+            ready = loop.create_future()
+            stop = asyncio.Event()
+            task = asyncio.create_task(self._serve(server_name, server_config, ready, stop))
+            connection = self._connections[server_name] = (task, stop, ready, fingerprint)
+        
+        return await asyncio.shield(connection[2])
+
+    async def apply(self, server_name: str, server_config: dict, fn: MCPSessionFunction) -> Any:
+        """Run fn against the pooled session, reconnecting next time if the session broke"""
+        session = await self.get(server_name, server_config)
+        try:
+            return await fn(server_name, session)
+        except Exception as e:
+            if _is_connection_error(e):
+                logger.warning("⚠️ Lost connection to MCP server %s, it will be restarted on next use", server_name)
+                await self._close(server_name)
+            raise
+
+    async def aclose(self) -> None:
+        """Close all sessions and stop their servers"""
+        await asyncio.gather(*(self._close(name) for name in list(self._connections)))
+
+    async def _close(self, server_name: str) -> None:
+        connection = self._connections.pop(server_name, None)
+        self.sessions.pop(server_name, None)
+        if connection is None:
+            return
+        task, stop, _, _ = connection
+        stop.set()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def _serve(
+        self,
+        server_name: str,
+        server_config: dict,
+        ready: asyncio.Future,
+        stop: asyncio.Event,
+    ) -> None:
+        session = None
+        try:
+            async with open_session(server_name, server_config) as session:
+                self.sessions[server_name] = session
+                ready.set_result(session)
+                await stop.wait()
+        except Exception as e:
+            if ready.done():
+                logger.debug("MCP session for %s closed: %r", server_name, e)
+            else:
+                # Failed to connect: surface the error to callers
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                # Cancelled while connecting
+                ready.cancel()
+            # The session is gone, so the next call reconnects
+            if self._connections.get(server_name, (None,))[0] is asyncio.current_task():
+                del self._connections[server_name]
+            if session is not None and self.sessions.get(server_name) is session:
+                del self.sessions[server_name]
+
+
+# Shared pool of MCP sessions, one per server
+server_manager = MCPServerManager()
+
+
+async def apply(server_name: str, server_config: dict, fn: MCPSessionFunction) -> Any:
+    """Run fn against the server's pooled session, starting the server on first use"""
+    return await server_manager.apply(server_name, server_config, fn)
@@ -1,10 +1,16 @@
-from typing import TypedDict, Literal, Any
+from typing import Annotated, TypedDict, Literal, Any
 from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
 
 
-class SimpleMCPState(TypedDict):
-    messages: list[BaseMessage]
+class SimpleMCPState(TypedDict, total=False):
+    """Graph state shared by src/main.py and the MCP example graph.
+
+    All keys are optional: nodes return partial updates and read with .get().
+    """
+    messages: Annotated[list[BaseMessage], add_messages]  # Nodes return only new messages
     available_tools: list[Any]  # Now stores actual LangChain tool objects instead of schemas
     mcp_servers: dict[str, Any]  # MCP server configurations for on-demand execution
-    server_manager: Any | None  # MCPServerManager instance for managing persistent sessions
-    status: Literal["idle", "loading_tools", "ready", "calling_tool", "error", "finished"] 
\ No newline at end of file
+    tool_to_server: dict[str, str]  # Tool name -> name of the MCP server that provides it
+    status: Literal["idle", "loading_tools", "ready", "calling_tool", "error", "finished"]
+    last_message_kind: Literal["tool_call", "tool_result", "text", "error"]  # Kind of the last step's output, for routing
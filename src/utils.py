@@ -1,22 +1,219 @@
 import os
-import json
+import io
+import asyncio
+import re
+import sys
+import queue
+import atexit
 import logging
-from datetime import datetime
+import logging.handlers
+import functools
+import importlib.util
+import httpx
+from httpx._utils import get_environment_proxies
+import orjson
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.tools import ToolException
 from langchain_openai import AzureChatOpenAI
 
+# Azure OpenAI settings, read once at import
+_AZURE_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini")
+_AZURE_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
+
+# Only needed for non-Azure providers
+try:
+    from langchain.chat_models import init_chat_model
+except ImportError:
+    init_chat_model = None
+
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """StreamHandler that doesn't flush after every record; the listener flushes instead"""
+    autoflush = False
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if self.autoflush:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class _BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever the queue drains
+
+    A burst of log records is written with a single flush, and nothing sits in
+    the buffer once the burst is over.
+    """
+    def __init__(self, queue_handler: logging.handlers.QueueHandler, *handlers):
+        super().__init__(queue_handler.queue, *handlers)
+        self.queue_handler = queue_handler
+
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return self.queue.get(block)
+
+    def stop(self):
+        """Drain the queue and hand the root logger over to the handlers directly
+
+        Records logged after this (e.g. from atexit hooks that run later) are
+        written and flushed synchronously instead of being queued with no listener.
+        """
+        root = logging.getLogger()
+        for handler in self.handlers:
+            handler.autoflush = True
+            root.addHandler(handler)
+        root.removeHandler(self.queue_handler)
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+def _buffered_stderr():
+    """Block-buffered text stream on the stderr file descriptor, or sys.stderr if it has none"""
+    try:
+        raw = io.FileIO(sys.stderr.fileno(), "w", closefd=False)
+    except (AttributeError, OSError, ValueError):
+        return sys.stderr
+    return io.TextIOWrapper(
+        io.BufferedWriter(raw, buffer_size=65536),
+        encoding=sys.stderr.encoding or "utf-8",
+        errors="backslashreplace",
+    )
+
+
+def _configure_logging() -> None:
+    """Log through a queue so callers never block on stderr writes
+
+    The message itself is still interpolated on the calling thread (QueueHandler
+    merges the args before enqueueing); the background listener thread adds the
+    timestamp/level prefix and does the writing. Output goes to file descriptor 2
+    directly, so redirecting sys.stderr (contextlib.redirect_stderr, notebook
+    kernels) does not capture these logs. Like logging.basicConfig, this does
+    nothing if the root logger is already configured.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    
+    stream_handler = _BufferedStreamHandler(_buffered_stderr())
+    stream_handler.setFormatter(logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    listener = _BatchingQueueListener(queue_handler, stream_handler)
+    
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
+    listener.start()
+    # Registered after logging's own shutdown hook, so it runs first and drains the queue
+    atexit.register(listener.stop)
+
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+_configure_logging()
 logger = logging.getLogger(__name__)
 
+# Bound log methods for the per-tool-call logging paths
+_DEBUG = logger.debug
+_INFO = logger.info
+_WARNING = logger.warning
+_ERROR = logger.error
+
+# Validation errors and HTTP status codes recognized in plain-text tool errors, found
+# in a single pass. A validation error takes precedence over any status code.
+_ERROR_PATTERN = re.compile(
+    r"(?P<validation>validation_error)|\b(?P<status>400|401|403|404|429|500)\b",
+    re.IGNORECASE
+)
+
+# LLM-facing descriptions of common HTTP error statuses
+_HTTP_ERROR_MESSAGES = {
+    400: "Bad Request - The request was invalid or malformed",
+    401: "Unauthorized - Authentication failed or token is invalid",
+    403: "Forbidden - Access denied to the requested resource",
+    404: "Not Found - The requested resource does not exist",
+    429: "Rate Limited - Too many requests, please wait before retrying",
+    500: "Internal Server Error - Something went wrong on the server"
+}
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """Keep-alive connection pool per event loop
+
+    Pooled connections belong to the loop that opened them, so a client that
+    outlives a loop (e.g. held by a cached model across ``asyncio.run`` calls)
+    gets a fresh pool on the new loop instead of failing with "Event loop is closed".
+    Pools of closed loops are dropped on the next request.
+    """
+    def __init__(self, **transport_kwargs):
+        self._transport_kwargs = transport_kwargs
+        self._transports: dict[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            # The pooled sockets reference their loop, so a weak mapping never lets it go
+            for closed in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed]
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+        return await transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the current event loop's connections"""
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+# Connection pool shared by every model that uses get_http_async_client().
+# HTTP/2 is used when the optional h2 package is installed.
+_TRANSPORT_KWARGS = dict(
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    http2=importlib.util.find_spec("h2") is not None,
+)
+_HTTP_TRANSPORT = _PerLoopTransport(**_TRANSPORT_KWARGS)
+_PROXY_TRANSPORTS: dict[str, _PerLoopTransport] = {}
+
+
+@functools.cache
+def get_http_async_client() -> httpx.AsyncClient:
+    """Shared async HTTP client so every model reuses the same keep-alive connection pool"""
+    # httpx skips HTTP(S)_PROXY/ALL_PROXY/NO_PROXY once a transport is passed,
+    # so mount the environment's proxy routes here.
+    mounts: dict[str, _PerLoopTransport | None] = {}
+    for pattern, proxy_url in get_environment_proxies().items():
+        if proxy_url is None:
+            mounts[pattern] = None
+        else:
+            mounts[pattern] = _PROXY_TRANSPORTS.setdefault(
+                proxy_url, _PerLoopTransport(proxy=proxy_url, **_TRANSPORT_KWARGS)
+            )
+    return httpx.AsyncClient(transport=_HTTP_TRANSPORT, mounts=mounts, timeout=60.0)
+
+
+async def aclose_http_connections() -> None:
+    """Close the shared client's connections for the running event loop
+
+    Call before the loop ends; the client itself stays usable and reconnects on demand.
+    """
+    await _HTTP_TRANSPORT.aclose()
+    for transport in _PROXY_TRANSPORTS.values():
+        await transport.aclose()
+
 
 def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
+    Models are cached per provider and model, so repeated calls reuse the same client
+    instead of constructing a new one. Azure deployment settings are read from the
+    environment once, at import (load_dotenv must run before this module is imported).
+
     Args:
         fully_specified_name (str): String in the format 'provider/model' or just model name.
                                    For Azure OpenAI, this can be 'azure/gpt-4o-mini' or just 'gpt-4o-mini'.
@@ -28,22 +225,73 @@ def load_chat_model(fully_specified_name: str) -> BaseChatModel:
         provider = "azure"  # Default to Azure
         model = fully_specified_name
     
+    return _build_chat_model(provider.lower(), model)
+
+
+@functools.lru_cache(maxsize=32)
+def _build_chat_model(provider: str, model: str) -> BaseChatModel:
+    """Construct a chat model, once per provider and model"""
     # Configure Azure OpenAI
-    if provider.lower() in ["azure", "azure_openai"]:
+    if provider in ["azure", "azure_openai"]:
         return AzureChatOpenAI(
-            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
+            azure_deployment=_AZURE_DEPLOYMENT,
+            api_version=_AZURE_API_VERSION,
             temperature=0,
             max_tokens=None,
             timeout=None,
             max_retries=2,
+            http_async_client=get_http_async_client(),
         )
     else:
         # Fallback to original implementation for other providers
-        from langchain.chat_models import init_chat_model
+        if init_chat_model is None:
+            raise RuntimeError(f"The langchain package is required to load '{provider}' chat models")
         return init_chat_model(model, model_provider=provider)
 
 
+def configure_llm_cache() -> None:
+    """Enable LangChain's global LLM response cache selected by LLM_CACHE
+
+    Identical prompts (same messages, tools and model settings) are then answered
+    from the cache instead of a new API call. Supported backends:
+        memory: in-process, bounded by LLM_CACHE_MAXSIZE (default 1024)
+        sqlite: local database at LLM_CACHE_PATH, survives restarts (dev/replays)
+        redis: shared between workers, connects to REDIS_URL
+    Any other value (including unset) leaves caching disabled.
+    """
+    backend = os.getenv("LLM_CACHE", "").lower()
+    
+    if backend == "memory":
+        from langchain_core.caches import InMemoryCache
+        cache = InMemoryCache(maxsize=int(os.getenv("LLM_CACHE_MAXSIZE", "1024")))
+    elif backend == "sqlite":
+        from langchain_community.cache import SQLiteCache
+        cache = SQLiteCache(database_path=os.getenv("LLM_CACHE_PATH", ".langchain.db"))
+    elif backend == "redis":
+        import redis
+        from langchain_community.cache import RedisCache
+        cache = RedisCache(redis.Redis.from_url(os.environ["REDIS_URL"]))
+    else:
+        if backend:
+            logger.warning("Unknown LLM_CACHE backend '%s', LLM response cache disabled", backend)
+        return
+    
+    from langchain_core.globals import set_llm_cache
+    set_llm_cache(cache)
+    logger.info("LLM response cache enabled (%s)", backend)
+
+
+def _classify_error(error_content: str) -> str | int | None:
+    """Return "validation", the first HTTP status code found, or None"""
+    status = None
+    for match in _ERROR_PATTERN.finditer(error_content):
+        if match.lastgroup == "validation":
+            return "validation"
+        if status is None:
+            status = int(match.group("status"))
+    return status
+
+
 def extract_error_details(exception: Exception) -> str:
     """Extract meaningful error details for LLM feedback
     
@@ -53,36 +301,34 @@ def extract_error_details(exception: Exception) -> str:
     Returns:
         str: Formatted error message suitable for LLM understanding
     """
-    logger.error(f"Extracting error details from: {type(exception).__name__}: {exception}")
+    _ERROR("Extracting error details from: %s: %s", type(exception).__name__, exception)
     
     # Handle ToolException from MCP
-    if hasattr(exception, '__class__') and 'ToolException' in str(type(exception)):
+    if isinstance(exception, ToolException):
         try:
             error_content = str(exception)
-            logger.debug(f"Raw ToolException content: {error_content}")
+            _DEBUG("Raw ToolException content: %s", error_content)
             
-            # Try to parse as JSON first
-            try:
-                error_data = json.loads(error_content)
-                if isinstance(error_data, dict):
-                    return format_structured_error(error_data)
-            except json.JSONDecodeError:
-                pass
+            # Try to parse as JSON first, but only when the content can be JSON at all
+            if error_content.lstrip()[:1] in ("{", "["):
+                try:
+                    error_data = orjson.loads(error_content)
+                    if isinstance(error_data, dict):
+                        return _format_structured_error(error_data)
+                except orjson.JSONDecodeError:
+                    pass
             
             # If not JSON, check for common error patterns
-            if "validation_error" in error_content.lower():
+            category = _classify_error(error_content)
+            if category == "validation":
                 return f"Validation Error: {error_content[:300]}..."
-            elif "400 bad request" in error_content.lower():
-                return format_http_error(error_content, 400)
-            elif "401" in error_content:
-                return format_http_error(error_content, 401)
-            elif "404" in error_content:
-                return format_http_error(error_content, 404)
+            elif category is not None:
+                return format_http_error(error_content, category)
             
             return f"Tool execution error: {error_content}"
             
         except Exception as parse_error:
-            logger.warning(f"Failed to parse ToolException: {parse_error}")
+            _WARNING("Failed to parse ToolException: %s", parse_error)
             return f"Tool execution failed: {str(exception)}"
     
     # Handle other exception types
@@ -98,11 +344,16 @@ def format_structured_error(error_data: dict) -> str:
     Returns:
         str: Human-readable error message
     """
-    logger.debug(f"Formatting structured error: {error_data}")
-    
     if not isinstance(error_data, dict):
         return str(error_data)
     
+    return _format_structured_error(error_data)
+
+
+def _format_structured_error(error_data: dict) -> str:
+    """format_structured_error for callers that already checked error_data is a dict"""
+    logger.debug("Formatting structured error: %s", error_data)
+    
     # Extract common fields
     status = error_data.get('status', 'unknown')
     code = error_data.get('code', 'unknown_error')
@@ -127,24 +378,17 @@ def format_http_error(error_content: str, status_code: int) -> str:
     Returns:
         str: Formatted HTTP error message
     """
-    logger.debug(f"Formatting HTTP {status_code} error")
+    logger.debug("Formatting HTTP %s error", status_code)
     
-    error_messages = {
-        400: "Bad Request - The request was invalid or malformed",
-        401: "Unauthorized - Authentication failed or token is invalid", 
-        403: "Forbidden - Access denied to the requested resource",
-        404: "Not Found - The requested resource does not exist",
-        429: "Rate Limited - Too many requests, please wait before retrying",
-        500: "Internal Server Error - Something went wrong on the server"
-    }
-    
-    base_message = error_messages.get(status_code, f"HTTP {status_code} Error")
+    base_message = _HTTP_ERROR_MESSAGES.get(status_code, f"HTTP {status_code} Error")
     
     # Extract additional context if available
     if "request_id" in error_content:
-        return f"{base_message}. {error_content[:200]}..."
+        preview = error_content[:200]
+        return f"{base_message}. {preview}..."
     
-    return f"{base_message}: {error_content[:150]}..."
+    preview = error_content[:150]
+    return f"{base_message}: {preview}..."
 
 
 def format_validation_message(message: str, status: str) -> str:
@@ -158,16 +402,42 @@ def format_validation_message(message: str, status: str) -> str:
         str: Formatted message for LLM
     """
     if "body.children[0]" in message:
-        return (
-            f"Notion Block Validation Error ({status}): "
-            f"The block content structure is incorrect. "
-            f"Each block must have exactly one content type defined (paragraph, heading, list, etc.). "
-            f"Original error: {message[:200]}..."
-        )
+        # status may be an int when it comes from a parsed JSON error
+        return "".join((
+            "Notion Block Validation Error (", str(status), "): "
+            "The block content structure is incorrect. "
+            "Each block must have exactly one content type defined (paragraph, heading, list, etc.). "
+            "Original error: ", message[:200], "..."
+        ))
     
     return f"Validation Error ({status}): {message}"
 
 
+def _log_started(tool_name: str, server_name: str, args: dict, details: str):
+    # Tools can take large payloads (e.g. Notion block arrays), so cap the args at 200 chars
+    _INFO("🔧 TOOL_EXEC_START: %s on %s with args: %.200s", tool_name, server_name, args)
+
+
+def _log_success(tool_name: str, server_name: str, args: dict, details: str):
+    _INFO("✅ TOOL_EXEC_SUCCESS: %s on %s", tool_name, server_name)
+    if details:
+        # This provides really useful information for the LLM to understand the result of the tool execution.
+        _INFO("🆕 Result preview: %.100s...", details)
+
+
+def _log_failed(tool_name: str, server_name: str, args: dict, details: str):
+    _ERROR("❌ TOOL_EXEC_FAILED: %s on %s", tool_name, server_name)
+    _ERROR("    Error details: %s", details)
+
+
+# Level and log function for each tool execution status
+_STATUS_HANDLERS = {
+    "started": (logging.INFO, _log_started),
+    "success": (logging.INFO, _log_success),
+    "failed": (logging.ERROR, _log_failed),
+}
+
+
 def log_tool_execution(tool_name: str, server_name: str, args: dict, status: str, details: str = ""):
     """Log tool execution with structured format
     
@@ -178,17 +448,12 @@ def log_tool_execution(tool_name: str, server_name: str, args: dict, status: str
         status: Execution status (started, success, failed)
         details: Additional details or error info
     """
-    timestamp = datetime.now().isoformat()
-    
-    if status == "started":
-        logger.info(f"🔧 [{timestamp}] TOOL_EXEC_START: {tool_name} on {server_name} with args: {args}")
-    elif status == "success":
-        logger.info(f"✅ [{timestamp}] TOOL_EXEC_SUCCESS: {tool_name} on {server_name}")
-        if details:
-            # This provides really useful information for the LLM to understand the result of the tool execution.
-            logger.info(f"🆕 Result preview: {details[:100]}...")
-    elif status == "failed":
-        logger.error(f"❌ [{timestamp}] TOOL_EXEC_FAILED: {tool_name} on {server_name}")
-        logger.error(f"    Error details: {details}")
-    else:
-        logger.warning(f"⚠️ [{timestamp}] TOOL_EXEC_{status.upper()}: {tool_name} on {server_name} - {details}")
\ No newline at end of file
+    entry = _STATUS_HANDLERS.get(status)
+    if entry is None:
+        _WARNING("⚠️ TOOL_EXEC_%s: %s on %s - %s", status.upper(), tool_name, server_name, details)
+        return
+    
+    # Skip the call entirely when the record would be dropped
+    level, log = entry
+    if logger.isEnabledFor(level):
+        log(tool_name, server_name, args, details)
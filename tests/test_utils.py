@@ -0,0 +1,81 @@
+import asyncio
+import subprocess
+import sys
+import textwrap
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from src import utils
+
+
+@pytest.fixture
+def fresh_client():
+    utils.get_http_async_client.cache_clear()
+    yield utils.get_http_async_client
+    utils.get_http_async_client.cache_clear()
+
+
+def test_http_client_mounts_https_proxy(monkeypatch, fresh_client):
+    for name in ("HTTP_PROXY", "http_proxy", "ALL_PROXY", "all_proxy", "NO_PROXY", "no_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:3128")
+
+    client = fresh_client()
+
+    transport = client._transport_for_url(httpx.URL("https://api.example.com"))
+    assert transport is utils._PROXY_TRANSPORTS["http://proxy.example:3128"]
+    assert client._transport_for_url(httpx.URL("http://api.example.com")) is utils._HTTP_TRANSPORT
+
+
+def test_http_client_honours_no_proxy(monkeypatch, fresh_client):
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:3128")
+    monkeypatch.setenv("NO_PROXY", "internal.example")
+
+    client = fresh_client()
+
+    assert client._transport_for_url(httpx.URL("https://api.internal.example")) is utils._HTTP_TRANSPORT
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_per_loop_transport_drops_closed_loops():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = utils._PerLoopTransport()
+    client = httpx.AsyncClient(transport=transport)
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    async def fetch():
+        return (await client.get(url)).status_code
+
+    try:
+        for _ in range(3):
+            assert asyncio.run(fetch()) == 200
+        assert len(transport._transports) == 1
+    finally:
+        server.shutdown()
+
+
+def test_logging_after_listener_stop_is_written():
+    script = textwrap.dedent("""
+        import atexit, logging
+        atexit.register(lambda: logging.getLogger("late").warning("after stop"))
+        import src.utils
+    """)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parents[1],
+    )
+    assert "[WARNING] late: after stop" in result.stderr